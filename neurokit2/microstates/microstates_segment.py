@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
+import joblib
 import numpy as np
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 from ..stats import cluster
+from ..stats.cluster import _cluster_method
 from ..stats.cluster_quality import _cluster_quality_gev
 from .microstates_classify import microstates_classify
 from .microstates_clean import microstates_clean
@@ -15,11 +22,15 @@ def microstates_segment(
     gfp_method="l1",
     sampling_rate=None,
     standardize_eeg=False,
-    n_runs=10,
+    n_runs=None,
+    init="kmeans++",
     max_iterations=1000,
     criterion="gev",
     random_state=None,
     optimize=False,
+    n_jobs=-1,
+    backend="cpu",
+    single_precision=False,
     **kwargs
 ):
     """Segment a continuous M/EEG signal into microstates using different clustering algorithms.
@@ -62,7 +73,12 @@ def microstates_segment(
     n_runs : int
         The number of random initializations to use for the k-means algorithm.
         The best fitting segmentation across all initializations is used.
-        Defaults to 10.
+        Defaults to None, in which case 2 runs are used with the 'kmeans++' initialization
+        (which usually converges to a good solution with fewer runs) and 10 runs otherwise.
+    init : str
+        The initialization of the modified k-means algorithm. Can be 'kmeans++' (default), which
+        selects initial maps that are spread apart from each other, or 'random', which selects
+        random samples.
     max_iterations : int
         The maximum number of iterations to perform in the k-means algorithm.
         Defaults to 1000.
@@ -79,6 +95,18 @@ def microstates_segment(
     optimize : bool
         To use a new optimized method in https://www.biorxiv.org/content/10.1101/289850v1.full.pdf.
         For the k-means modified method. Default to False.
+    n_jobs : int
+        The number of jobs used to run the initializations of the modified k-means algorithm in
+        parallel. Defaults to -1, in which case all CPUs are used. See ``joblib.Parallel()``.
+    backend : str
+        Where to run the passes over the whole dataset (i.e., the scoring of the runs and the
+        assignment of each sample to a microstate). Can be 'cpu' (default) or 'cupy' to run them
+        on a GPU, which requires the ``cupy`` package and can be faster for long, high-density
+        recordings. The clustering itself (on the training data) always runs on the CPU.
+    single_precision : bool
+        Convert the data to single precision (float32) before clustering and segmentation. This
+        halves the memory traffic of the algorithms, which mostly rely on the argmax of the
+        activations (a decision that is robust to the loss of precision). Defaults to False.
 
     Returns
     -------
@@ -124,8 +152,8 @@ def microstates_segment(
     >>> nk.microstates_plot(out_ica, gfp=out_ica["GFP"][0:500]) #doctest: +ELLIPSIS
     <Figure ...>
     >>>
-    >>> # AAHC
-    >>> out_aahc = nk.microstates_segment(eeg, method='aahc')
+    >>> # AAHC (its cost grows with the cube of the number of training samples, so train on a subset)
+    >>> out_aahc = nk.microstates_segment(eeg, method='aahc', train=300)
     >>> nk.microstates_plot(out_aahc, gfp=out_aahc["GFP"][0:500]) #doctest: +ELLIPSIS
     <Figure ...>
 
@@ -141,6 +169,19 @@ def microstates_segment(
     on Biomedical Engineering.
 
     """
+    if backend not in ["cpu", "cupy"]:
+        raise ValueError(
+            "NeuroKit error: microstates_segment(): 'backend' should be one of 'cpu' or 'cupy'."
+        )
+    if init not in ["kmeans++", "random"]:
+        raise ValueError(
+            "NeuroKit error: microstates_segment(): 'init' should be one of 'kmeans++' or 'random'."
+        )
+    if criterion not in ["gev", "cv"]:
+        raise ValueError(
+            "NeuroKit error: microstates_segment(): 'criterion' should be one of 'gev' or 'cv'."
+        )
+
     # Sanitize input
     data, indices, gfp, info_mne = microstates_clean(
         eeg,
@@ -150,69 +191,69 @@ def microstates_segment(
         gfp_method=gfp_method,
         **kwargs
     )
+    data = np.ascontiguousarray(data, dtype=np.float32 if single_precision else None)
+
+    # Training data (samples x channels), copied once into a contiguous array shared across
+    # runs (rather than having each run or method make its own contiguous copy)
+    if np.all(np.diff(indices) == 1):
+        train_data = data[:, indices[0] : indices[-1] + 1]  # Consecutive samples: no fancy indexing
+    else:
+        train_data = data[:, indices]
+    train_data = np.ascontiguousarray(train_data.T)
 
     # Run clustering algorithm
-    if method in ["kmods", "kmod", "kmeans modified", "modified kmeans"]:
+    if _cluster_method(method) == "kmod":
 
         # If no random state specified, generate a random state
         if not isinstance(random_state, np.random.RandomState):
             random_state = np.random.RandomState(random_state)
 
+        if n_runs is None:
+            n_runs = 2 if init == "kmeans++" else 10
+
         # Generate one random integer for each run
         random_state = random_state.choice(range(n_runs * 1000), n_runs, replace=False)
 
-        # Initialize values
-        gev = 0
-        cv = np.inf
-        microstates = None
-        segmentation = None
-        polarity = None
-        info = None
-
-        # Do several runs of the k-means algorithm, keep track of the best segmentation.
-        for run in range(n_runs):
-
-            # Run clustering on subset of data
-            _, _, current_info = cluster(
-                data[:, indices].T,
+        # Do several runs of the k-means algorithm in parallel (each run is independent)
+        runs = joblib.Parallel(n_jobs=n_jobs, backend="loky")(
+            joblib.delayed(cluster)(
+                train_data,
                 method="kmod",
                 n_clusters=n_microstates,
                 random_state=random_state[run],
+                init=init,
                 max_iterations=max_iterations,
                 threshold=1e-6,
                 optimize=optimize,
             )
-            current_microstates = current_info["clusters_normalized"]
-            current_residual = current_info["residual"]
+            for run in range(n_runs)
+        )
+        runs = [run[2] for run in runs]  # Info of each run
 
-            # Run segmentation on the whole dataset
-            s, p, g, g_all = _microstates_segment_runsegmentation(
-                data, current_microstates, gfp, n_microstates=n_microstates
-            )
+        # Keep track of the best segmentation
+        if n_runs == 1:
+            # Nothing to compare (the segmentation is computed only once, below)
+            best = 0
+        elif criterion == "gev":
+            # Best is the highest GEV (of all runs computed at once on the whole dataset)
+            maps = np.array([run["clusters_normalized"] for run in runs])
+            best = np.argmax(_microstates_segment_gev(data, maps, gfp, backend=backend))
+        elif criterion == "cv":
+            # Best is the lowest CV
+            # R2 and residual are proportional, use residual instead of R2
+            best = np.argmin([run["residual"] for run in runs])
+        info = runs[best]
+        microstates = info["clusters_normalized"]
 
-            if criterion == "gev":
-                # If better (i.e., higher GEV), keep this segmentation
-                if g > gev:
-                    microstates, segmentation, polarity, gev = (
-                        current_microstates,
-                        s,
-                        p,
-                        g,
-                    )
-                    gev_all = g_all
-                    info = current_info
-            elif criterion == "cv":
-                # If better (i.e., lower CV), keep this segmentation
-                # R2 and residual are proportional, use residual instead of R2
-                if current_residual < cv:
-                    microstates, segmentation, polarity = current_microstates, s, p
-                    cv, gev, gev_all = current_residual, g, g_all
-                    info -= current_info
+        # Run segmentation of the best run on the whole dataset
+        segmentation, polarity, gev, gev_all = _microstates_segment_runsegmentation(
+            data, microstates, gfp, n_microstates=n_microstates, backend=backend
+        )
 
     else:
         # Run clustering algorithm on subset
         _, microstates, info = cluster(
-            data[:, indices].T,
+            train_data,
             method=method,
             n_clusters=n_microstates,
             random_state=random_state,
@@ -221,7 +262,7 @@ def microstates_segment(
 
         # Run segmentation on the whole dataset
         segmentation, polarity, gev, gev_all = _microstates_segment_runsegmentation(
-            data, microstates, gfp, n_microstates=n_microstates
+            data, microstates, gfp, n_microstates=n_microstates, backend=backend
         )
 
     # Reorder
@@ -248,14 +289,194 @@ def microstates_segment(
 # =============================================================================
 # Utils
 # =============================================================================
-def _microstates_segment_runsegmentation(data, microstates, gfp, n_microstates):
+def _microstates_segment_runsegmentation(data, microstates, gfp, n_microstates, backend="cpu"):
     # Find microstate corresponding to each datapoint
-    activation = microstates.dot(data)
-    segmentation = np.argmax(np.abs(activation), axis=0)
-    polarity = np.sign(np.choose(segmentation, activation))
+    if backend == "cupy":
+        segmentation, polarity = _microstates_segment_predict_cupy(data, microstates)
+    else:
+        segmentation, polarity = _microstates_segment_predict(data, microstates)
 
     # Get Global Explained Variance (GEV)
     gev, gev_all = _cluster_quality_gev(
         data.T, microstates, segmentation, sd=gfp, n_clusters=n_microstates
     )
     return segmentation, polarity, gev, gev_all
+
+
+def _microstates_segment_gev(data, microstates, gfp, block_size=4096, backend="cpu"):
+    """GEV of several sets of microstates (n_runs x n_states x n_channels) at once.
+    """
+    if backend == "cupy":
+        xp = _microstates_segment_cupy()
+        block_size = max(block_size, 2 ** 20 // len(data))
+    else:
+        xp = np
+
+    n_runs, n_states, n_channels = microstates.shape
+    maps = xp.asarray(microstates.reshape(n_runs * n_states, n_channels))
+    maps_centered = maps - xp.mean(maps, axis=1, keepdims=True, dtype=np.float64)
+    maps_centered /= xp.linalg.norm(maps_centered, axis=1, keepdims=True)
+    gfp = xp.asarray(gfp)
+
+    gev = xp.zeros(n_runs)
+    for start in range(0, data.shape[1], block_size):
+        block = xp.asarray(data[:, start : start + block_size])
+        activation = maps.dot(block).reshape(n_runs, n_states, -1)
+        segmentation = xp.argmax(xp.square(activation), axis=1)
+
+        block = block - xp.mean(block, axis=0, dtype=np.float64)  # As in _cluster_quality_gev()
+        map_corr = maps_centered.dot(block).reshape(n_runs, n_states, -1)
+        map_corr = xp.take_along_axis(map_corr, segmentation[:, None, :], axis=1)[:, 0, :]
+        map_corr /= xp.linalg.norm(block, axis=0)
+
+        gev += xp.sum((gfp[start : start + block_size] * map_corr) ** 2, axis=1)
+    gev /= xp.dot(gfp, gfp)
+    return gev.get() if backend == "cupy" else gev
+
+
+def _microstates_segment_predict(data, microstates, block_size=4096):
+    """Assign each sample to the microstate with the highest absolute activation.
+
+    The activations are computed block by block (n_states x block_size values at a time,
+    which fits in cache) instead of materializing the whole (n_states, n_times) activation
+    matrix and its absolute value.
+    """
+    n_times = data.shape[1]
+    segmentation = np.empty(n_times, dtype=int)
+    polarity = np.empty(n_times)
+
+    # Fused single pass over the samples if numba is available
+    if numba is not None:
+        if len(microstates) == 4:
+            kernel = _microstates_segment_predict_numba4
+        else:
+            kernel = _microstates_segment_predict_numba
+        kernel(np.ascontiguousarray(microstates), np.ascontiguousarray(data), segmentation, polarity)
+        return segmentation, polarity
+
+    # Activations (and their square, which preserves the argmax of the absolute value) are
+    # written into the same two buffers for all blocks
+    n_states = len(microstates)
+    buffer = np.empty(
+        (2, n_states * min(block_size, n_times)), dtype=np.result_type(microstates, data)
+    )
+    for start in range(0, n_times, block_size):
+        block = slice(start, start + block_size)
+        size = n_states * len(segmentation[block])
+        activation = buffer[0, :size].reshape(n_states, -1)
+        np.dot(microstates, data[:, block], out=activation)
+        squared = np.square(activation, out=buffer[1, :size].reshape(n_states, -1))
+        np.argmax(squared, axis=0, out=segmentation[block])
+        polarity[block] = np.sign(np.take_along_axis(activation, segmentation[None, block], axis=0))
+    return segmentation, polarity
+
+
+def _microstates_segment_predict_cupy(data, microstates, block_size=2 ** 20):
+    """Same as ``_microstates_segment_predict()``, but running on a GPU with cupy.
+
+    The data is transferred by chunks of samples so that recordings larger than the GPU
+    memory can be processed.
+    """
+    cupy = _microstates_segment_cupy()
+
+    n_times = data.shape[1]
+    segmentation = np.empty(n_times, dtype=int)
+    polarity = np.empty(n_times)
+
+    microstates = cupy.asarray(microstates)
+    for start in range(0, n_times, block_size):
+        block = slice(start, start + block_size)
+        activation = microstates.dot(cupy.asarray(data[:, block]))
+        states = cupy.argmax(cupy.square(activation), axis=0)
+        segmentation[block] = cupy.asnumpy(states)
+        activation = cupy.take_along_axis(activation, states[None, :], axis=0)[0]
+        polarity[block] = cupy.asnumpy(cupy.sign(activation))
+    return segmentation, polarity
+
+
+def _microstates_segment_cupy():
+    try:
+        import cupy
+    except ImportError:
+        raise ImportError(
+            "NeuroKit error: microstates_segment(): the 'cupy' module is required for this backend to run. ",
+            "Please install it first (`pip install cupy`).",
+        )
+    return cupy
+
+
+def _microstates_segment_predict_kernel(microstates, data, segmentation, polarity, block_size=256):
+    # Same as the numpy version, but each block of samples is processed in a single fused pass
+    # (the blocks being distributed across threads)
+    n_states, n_channels = microstates.shape
+    n_times = data.shape[1]
+    for block in numba.prange((n_times + block_size - 1) // block_size):
+        start = block * block_size
+        end = min(start + block_size, n_times)
+
+        # Activations of this block (contiguous along time so that the inner loop is vectorized)
+        activation = np.zeros((n_states, end - start))
+        for c in range(n_channels):
+            for k in range(n_states):
+                weight = microstates[k, c]
+                for t in range(start, end):
+                    activation[k, t - start] += weight * data[c, t]
+
+        # Argmax of the absolute activation
+        for t in range(end - start):
+            best = -1.0
+            best_state = 0
+            for k in range(n_states):
+                if abs(activation[k, t]) > best:
+                    best = abs(activation[k, t])
+                    best_state = k
+            segmentation[start + t] = best_state
+            polarity[start + t] = np.sign(activation[best_state, t])
+
+
+def _microstates_segment_predict_kernel4(microstates, data, segmentation, polarity, block_size=256):
+    # Same as above, specialized for 4 microstates (the most common case): the loop over states
+    # is unrolled into 4 independent accumulations, and the argmax into 3 comparisons
+    n_channels = microstates.shape[1]
+    n_times = data.shape[1]
+    for block in numba.prange((n_times + block_size - 1) // block_size):
+        start = block * block_size
+        end = min(start + block_size, n_times)
+
+        activation0 = np.zeros(end - start)
+        activation1 = np.zeros(end - start)
+        activation2 = np.zeros(end - start)
+        activation3 = np.zeros(end - start)
+        for c in range(n_channels):
+            weight0, weight1 = microstates[0, c], microstates[1, c]
+            weight2, weight3 = microstates[2, c], microstates[3, c]
+            for t in range(end - start):
+                x = data[c, start + t]
+                activation0[t] += weight0 * x
+                activation1[t] += weight1 * x
+                activation2[t] += weight2 * x
+                activation3[t] += weight3 * x
+
+        for t in range(end - start):
+            best_state = 0
+            best = activation0[t]
+            if abs(activation1[t]) > abs(best):
+                best_state = 1
+                best = activation1[t]
+            if abs(activation2[t]) > abs(best):
+                best_state = 2
+                best = activation2[t]
+            if abs(activation3[t]) > abs(best):
+                best_state = 3
+                best = activation3[t]
+            segmentation[start + t] = best_state
+            polarity[start + t] = np.sign(best)
+
+
+if numba is not None:
+    _microstates_segment_predict_numba = numba.njit(parallel=True, fastmath=True, cache=True)(
+        _microstates_segment_predict_kernel
+    )
+    _microstates_segment_predict_numba4 = numba.njit(parallel=True, fastmath=True, cache=True)(
+        _microstates_segment_predict_kernel4
+    )
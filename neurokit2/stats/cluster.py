@@ -6,9 +6,15 @@ import pandas as pd
 import sklearn.cluster
 import sklearn.mixture
 import sklearn.decomposition
+import sklearn.utils.extmath
 import scipy.spatial
 import scipy.linalg
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 from .cluster_quality import _cluster_quality_distance
 
 def cluster(data, method="kmeans", n_clusters=2, random_state=None, optimize=False, **kwargs):
@@ -107,61 +113,12 @@ def cluster(data, method="kmeans", n_clusters=2, random_state=None, optimize=Fal
     if isinstance(data, pd.DataFrame):
         data = data.values
 
-    method = method.lower()
-    # K-means
-    if method in ["kmeans", "k", "k-means", "kmean"]:
-        out = _cluster_kmeans(data,
-                              n_clusters=n_clusters,
-                              random_state=random_state,
-                              **kwargs)
-
-    # Modified k-means
-    elif method in ["kmods", "kmod", "kmeans modified", "modified kmeans"]:
-        out = _cluster_kmod(data, n_clusters=n_clusters,
-                            random_state=random_state, optimize=optimize, **kwargs)
-    # K-medoids
-    elif method in ["kmedoids", "k-medoids", "k-centers"]:
-        out = _cluster_kmedoids(data, n_clusters=n_clusters,
-                                random_state=random_state, **kwargs)
-
-    # PCA
-    elif method in ["pca", "principal", "principal component analysis"]:
-        out = _cluster_pca(data, n_clusters=n_clusters, random_state=random_state, **kwargs)
-
-    # ICA
-    elif method in ["ica", "independent", "independent component analysis"]:
-        out = _cluster_pca(data, n_clusters=n_clusters, random_state=random_state, **kwargs)
-
-    # Mixture
-    elif method in ["mixture", "mixt"]:
-        out = _cluster_mixture(data,
-                               n_clusters=n_clusters,
-                               bayesian=False,
-                               random_state=random_state,
-                               **kwargs)
-
-    # Frederic's AAHC
-    elif method in ["aahc_frederic", "aahc_eegmicrostates"]:
-        out = _cluster_aahc(data,
-                            n_clusters=n_clusters,
-                            random_state=random_state,
-                            **kwargs)
-
-    # Bayesian
-    elif method in ["bayesianmixture", "bayesmixt", "mixturebayesian", "mixturebayes"]:
-        out = _cluster_mixture(data,
-                               n_clusters=n_clusters,
-                               bayesian=True,
-                               random_state=random_state,
-                               **kwargs)
-
-    # Others
-    else:
-        out = _cluster_sklearn(data,
-                               n_clusters=n_clusters,
-                               **kwargs)
+    # Find the clustering function corresponding to the method
+    method = _cluster_method(method)
+    if method == "kmod":
+        kwargs["optimize"] = optimize
 
-    return out
+    return _cluster_functions[method](data, n_clusters=n_clusters, random_state=random_state, **kwargs)
 
 
 # =============================================================================
@@ -290,7 +247,7 @@ def _cluster_kmedoids(data, n_clusters=2, max_iterations=1000, random_state=None
 # Modified K-means
 # =============================================================================
 def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, random_state=None,
-                  optimize=False, **kwargs):
+                  optimize=False, init="kmeans++", **kwargs):
     """The modified K-means clustering algorithm,
 
     adapted from Marijn van Vliet and Frederic von Wegner.
@@ -315,6 +272,10 @@ def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, rando
     optimized : bool
         To use a new optimized method in https://www.biorxiv.org/content/10.1101/289850v1.full.pdf.
         For the Kmeans modified method. Default to False.
+    init : str
+        The method for selecting the initial topographic maps. Can be 'kmeans++' (default), which
+        spreads the initial maps apart (see ``_cluster_kmod_init()``), or 'random', which selects
+        random samples.
     **kwargs
         Other arguments to be passed into ``sklearn`` functions.
 
@@ -330,13 +291,18 @@ def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, rando
     """
     n_samples, n_channels = data.shape
 
-    # Cache this value for later to compute residual
-    data_sum_sq = np.sum(data ** 2)
+    # Cache this value for later to compute residual (single pass, no squared copy of the data)
+    data_sum_sq = np.einsum("ij,ij->", data, data)
 
-    # Select random timepoints for our initial topographic maps
+    # Select timepoints for our initial topographic maps
     if not isinstance(random_state, np.random.RandomState):
         random_state = np.random.RandomState(random_state)
-    init_times = random_state.choice(n_samples, size=n_clusters, replace=False)
+    if init == "random":
+        init_times = random_state.choice(n_samples, size=n_clusters, replace=False)
+    elif init == "kmeans++":
+        init_times = _cluster_kmod_init(data, n_clusters=n_clusters, random_state=random_state)
+    else:
+        raise ValueError("NeuroKit error: cluster(): 'init' should be one of 'kmeans++' or 'random'.")
 
     # Initialize random cluster centroids
     clusters = data[init_times, :]
@@ -347,11 +313,16 @@ def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, rando
 
     # Initialize iteration
     prev_residual = 0
+    if numba is not None:
+        data = np.ascontiguousarray(data)  # Row-wise access in the compiled assignment step
+        buffer = None
+    else:
+        # Activations and their square, reused across iterations
+        buffer = np.empty((2, n_clusters, n_samples), dtype=data.dtype)
     for i in range(max_iterations):
 
         # Step 3: Assign each sample to the best matching microstate
-        activation = clusters.dot(data.T)
-        segmentation = np.argmax(np.abs(activation), axis=0)
+        segmentation, activation = _cluster_kmod_assign(data, clusters, buffer)
 
         # Step 4: Recompute the topographic maps of the microstates, based on the
         # samples that were assigned to each state.
@@ -370,7 +341,7 @@ def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, rando
 
             if optimize:
                 # Method 2 - optimized segmentation
-                state_vals = data_state.T.dot(activation[state, idx])
+                state_vals = data_state.T.dot(activation[idx])
             else:
                 # Method 1 - eighen value
                 # step 4a
@@ -383,7 +354,8 @@ def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, rando
             clusters[state, :] = state_vals  # Store map
 
         # Estimate residual noise (step 5)
-        act_sum_sq = np.sum(np.sum(clusters[segmentation, :] * data, axis=1) ** 2)
+        projection = np.einsum("ij,ij->i", data, clusters[segmentation, :])
+        act_sum_sq = np.dot(projection, projection)
         residual = np.abs(data_sum_sq - act_sum_sq)
         residual = residual / np.float(n_samples * (n_channels - 1))
 
@@ -409,6 +381,7 @@ def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, rando
                                             max_iterations=max_iterations,
                                             threshold=threshold,
                                             random_state=random_state,
+                                            init=init,
                                             **kwargs)
 
     # Info dump
@@ -421,6 +394,128 @@ def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, rando
     return prediction, clusters_unnormalized, info
 
 
+def _cluster_kmod_assign(data, clusters, buffer=None):
+    """Assign each sample to the map with the highest absolute activation.
+
+    Returns the segmentation and the (signed) activation of each sample with its assigned map.
+    If numba is available, both are computed in a single parallel pass over the samples
+    without materializing the (n_clusters, n_samples) activation matrix. Otherwise, the
+    activations and their square are written into ``buffer`` (of shape
+    (2, n_clusters, n_samples)), if provided.
+    """
+    if numba is not None:
+        segmentation = np.empty(len(data), dtype=int)
+        activation = np.empty(len(data))
+        if len(clusters) == 4:
+            _cluster_kmod_assign_numba4(data, clusters, segmentation, activation)
+        else:
+            _cluster_kmod_assign_numba(data, clusters, segmentation, activation)
+        return segmentation, activation
+
+    if buffer is None:
+        buffer = np.empty((2, len(clusters), len(data)), dtype=np.result_type(clusters, data))
+    # Direct BLAS call (dgemm or sgemm) overwriting the buffer. It computes the transposed
+    # activations (data x clusters.T), for which the transposes of the C-ordered arrays are
+    # Fortran-ordered views (no copy)
+    gemm = scipy.linalg.get_blas_funcs("gemm", (clusters, data))
+    activation = gemm(1.0, data.T, clusters.T, trans_a=1, c=buffer[0].T, overwrite_c=1).T
+    # Squaring preserves the argmax of the absolute value
+    segmentation = np.argmax(np.square(activation, out=buffer[1]), axis=0)
+    return segmentation, np.take_along_axis(activation, segmentation[None, :], axis=0)[0]
+
+
+def _cluster_kmod_assign_kernel(data, clusters, segmentation, activation):
+    n_clusters, n_channels = clusters.shape
+    for t in numba.prange(data.shape[0]):
+        best = -1.0
+        best_state = 0
+        best_activation = 0.0
+        for k in range(n_clusters):
+            current = 0.0
+            for c in range(n_channels):
+                current += clusters[k, c] * data[t, c]
+            if abs(current) > best:
+                best = abs(current)
+                best_state = k
+                best_activation = current
+        segmentation[t] = best_state
+        activation[t] = best_activation
+
+
+def _cluster_kmod_assign_kernel4(data, clusters, segmentation, activation):
+    # Same as above, specialized for 4 clusters (the most common case for microstates): each
+    # sample is read once, into 4 independent accumulations
+    n_channels = clusters.shape[1]
+    for t in numba.prange(data.shape[0]):
+        activation0 = 0.0
+        activation1 = 0.0
+        activation2 = 0.0
+        activation3 = 0.0
+        for c in range(n_channels):
+            x = data[t, c]
+            activation0 += clusters[0, c] * x
+            activation1 += clusters[1, c] * x
+            activation2 += clusters[2, c] * x
+            activation3 += clusters[3, c] * x
+
+        best_state = 0
+        best = activation0
+        if abs(activation1) > abs(best):
+            best_state = 1
+            best = activation1
+        if abs(activation2) > abs(best):
+            best_state = 2
+            best = activation2
+        if abs(activation3) > abs(best):
+            best_state = 3
+            best = activation3
+        segmentation[t] = best_state
+        activation[t] = best
+
+
+if numba is not None:
+    _cluster_kmod_assign_numba = numba.njit(parallel=True, fastmath=True, cache=True)(
+        _cluster_kmod_assign_kernel
+    )
+    _cluster_kmod_assign_numba4 = numba.njit(parallel=True, fastmath=True, cache=True)(
+        _cluster_kmod_assign_kernel4
+    )
+
+
+def _cluster_kmod_init(data, n_clusters=4, random_state=None):
+    """k-means++ seeding (Arthur & Vassilvitskii, 2007) adapted to the modified K-means.
+
+    The first map is a random sample, and each next map is a sample drawn with a probability
+    proportional to its (polarity-invariant) distance to the closest map already selected,
+    i.e., 1 minus its squared cosine similarity. Distances are updated incrementally.
+    """
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    n_samples = len(data)
+    norm = np.linalg.norm(data, axis=1)
+    data_normalized = data / np.where(norm == 0, 1, norm)[:, np.newaxis]
+
+    # Samples with a null topography are never selected (distance of 0)
+    distance = (norm > 0).astype(float)
+    candidates = np.flatnonzero(distance) if np.any(distance) else np.arange(n_samples)
+
+    init_times = np.zeros(n_clusters, dtype=int)
+    init_times[0] = random_state.choice(candidates)
+    for k in range(1, n_clusters):
+        similarity = data_normalized.dot(data_normalized[init_times[k - 1]])
+        distance = np.minimum(distance, np.clip(1 - similarity ** 2, 0, None))
+        if np.sum(distance) > 0:
+            probabilities = distance / np.sum(distance)
+        else:
+            # Fewer distinct topographies than clusters: uniform among the samples not selected yet
+            probabilities = np.ones(n_samples)
+            probabilities[init_times[:k]] = 0
+            probabilities /= np.sum(probabilities)
+        init_times[k] = random_state.choice(n_samples, p=probabilities)
+
+    return init_times
+
+
 
 # =============================================================================
 # PCA
@@ -428,22 +523,38 @@ def _cluster_kmod(data, n_clusters=4, max_iterations=1000, threshold=1e-6, rando
 def _cluster_pca(data, n_clusters=2, random_state=None, **kwargs):
     """Principal Component Analysis (PCA) for clustering.
     """
+    # The PCA is computed directly (not with sklearn), so there are no options to pass on
+    if kwargs:
+        raise TypeError(
+            "NeuroKit error: cluster(): unexpected argument(s) for the 'pca' method: "
+            + ", ".join(kwargs)
+        )
+
     # Fit PCA
-    pca = sklearn.decomposition.PCA(n_components=n_clusters,
-                                    copy=True,
-                                    whiten=True,
-                                    svd_solver='auto',
-                                    random_state=random_state,
-                                    **kwargs)
-    pca = pca.fit(data)
-    # clusters = np.array([pca.components_[state, :] for state in range(n_clusters)])
-
-    # Compute variance explained
-#    explained_var = pca.explained_variance_ratio_
-#    total_explained_var = np.sum(pca.explained_variance_ratio_)
+    centered = data - np.mean(data, axis=0)
+    n_features = data.shape[1]
+    if n_features > 500 and n_clusters < 0.8 * n_features:
+        # Many features and few components: only compute the top singular vectors (with enough
+        # power iterations for the components to match those of the full SVD)
+        _, singular_vals, components = sklearn.utils.extmath.randomized_svd(
+            centered, n_components=n_clusters, n_iter=7, random_state=random_state
+        )
+        explained_variance = singular_vals ** 2 / (len(data) - 1)
+    else:
+        # The covariance matrix is small (n_features x n_features) and symmetric, so its
+        # eigendecomposition is much cheaper than the SVD of the whole data
+        eigen_vals, eigen_vectors = np.linalg.eigh(centered.T.dot(centered) / (len(data) - 1))
+        order = np.argsort(eigen_vals)[::-1][:n_clusters]  # Sort by decreasing variance
+        explained_variance = eigen_vals[order]
+        components = eigen_vectors[:, order].T
+
+    # Get distance (whitened loadings)
+    prediction = centered.dot(components.T) / np.sqrt(explained_variance)
+
+    # Deterministic signs (largest loading of each component is positive, as in sklearn)
+    signs = np.sign(prediction[np.argmax(np.abs(prediction), axis=0), np.arange(len(components))])
+    prediction *= signs
 
-    # Get distance
-    prediction = pca.transform(data)
     prediction = pd.DataFrame(prediction).add_prefix("Loading_")
     prediction["Cluster"] = prediction.abs().idxmax(axis=1).values
     prediction["Cluster"] = [np.where(prediction.columns == state)[0][0] for state in prediction["Cluster"]]
@@ -454,8 +565,7 @@ def _cluster_pca(data, n_clusters=2, random_state=None, **kwargs):
     # Copy function with given parameters
     clustering_function = functools.partial(_cluster_pca,
                                             n_clusters=n_clusters,
-                                            random_state=random_state,
-                                            **kwargs)
+                                            random_state=random_state)
 
     # Info dump
     info = {"n_clusters": n_clusters,
@@ -474,7 +584,7 @@ def _cluster_ica(data, n_clusters=2, random_state=None, **kwargs):
     # Fit ICA
     ica = sklearn.decomposition.FastICA(n_components=n_clusters,
                                         algorithm='parallel',
-                                        whiten=True,
+                                        whiten="unit-variance",
                                         fun='exp',
                                         random_state=random_state,
                                         **kwargs)
@@ -508,15 +618,17 @@ def _cluster_ica(data, n_clusters=2, random_state=None, **kwargs):
 # =============================================================================
 # SKLEARN
 # =============================================================================
-def _cluster_sklearn(data, method="spectral", n_clusters=2, **kwargs):
+def _cluster_sklearn(data, method="spectral", n_clusters=2, random_state=None, **kwargs):
     """Spectral clustering
     """
     # Initialize clustering function
-    if method in ["spectral"]:
-        clustering_model = sklearn.cluster.SpectralClustering(n_clusters=n_clusters, **kwargs)
-    elif method in ["hierarchical", "ward"]:
+    if method == "spectral":
+        clustering_model = sklearn.cluster.SpectralClustering(n_clusters=n_clusters,
+                                                              random_state=random_state,
+                                                              **kwargs)
+    elif method == "hierarchical":
         clustering_model = sklearn.cluster.AgglomerativeClustering(n_clusters=n_clusters, linkage="ward", **kwargs)
-    elif method in ["agglomerative", "single"]:
+    elif method == "agglomerative":
         clustering_model = sklearn.cluster.AgglomerativeClustering(n_clusters=n_clusters, linkage="single", **kwargs)
 
     # Fit
@@ -531,7 +643,9 @@ def _cluster_sklearn(data, method="spectral", n_clusters=2, **kwargs):
 
     # Else, copy function
     clustering_function = functools.partial(_cluster_sklearn,
+                                            method=method,
                                             n_clusters=n_clusters,
+                                            random_state=random_state,
                                             **kwargs)
 
     # Info dump
@@ -626,7 +740,7 @@ def _cluster_aahc(data, n_clusters=2, gfp=None, gfp_peaks=None, gfp_sum_sq=None,
     if gfp is None and gfp_peaks is None and gfp_sum_sq is None:
         gfp = data.std(axis=1)
         gfp_peaks = locmax(gfp)
-        gfp_sum_sq = np.sum(gfp**2)  # normalizing constant in GEV
+        gfp_sum_sq = np.dot(gfp, gfp)  # normalizing constant in GEV
         if use_peaks:
             maps = data[gfp_peaks, :]  # initialize clusters
             cluster_data = data[gfp_peaks, :]  # store original gfp peak indices
@@ -717,6 +831,43 @@ def _cluster_aahc(data, n_clusters=2, gfp=None, gfp_peaks=None, gfp_sum_sq=None,
 # =============================================================================
 # =============================================================================
 
+# Aliases of each method, and corresponding clustering function
+_cluster_methods = {
+    "kmeans": ["kmeans", "k", "k-means", "kmean"],
+    "kmod": ["kmods", "kmod", "kmeans modified", "modified kmeans"],
+    "kmedoids": ["kmedoids", "k-medoids", "k-centers"],
+    "pca": ["pca", "principal", "principal component analysis"],
+    "ica": ["ica", "independent", "independent component analysis"],
+    "mixture": ["mixture", "mixt"],
+    "mixturebayesian": ["bayesianmixture", "bayesmixt", "mixturebayesian", "mixturebayes"],
+    "aahc": ["aahc", "aahc_frederic", "aahc_eegmicrostates"],
+    "spectral": ["spectral"],
+    "hierarchical": ["hierarchical", "ward"],
+    "agglomerative": ["agglomerative", "single"],
+}
+_cluster_aliases = {alias: method for method, aliases in _cluster_methods.items() for alias in aliases}
+
+_cluster_functions = {
+    "kmeans": _cluster_kmeans,
+    "kmod": _cluster_kmod,
+    "kmedoids": _cluster_kmedoids,
+    "pca": _cluster_pca,
+    "ica": _cluster_ica,
+    "mixture": functools.partial(_cluster_mixture, bayesian=False),
+    "mixturebayesian": functools.partial(_cluster_mixture, bayesian=True),
+    "aahc": _cluster_aahc,
+    "spectral": functools.partial(_cluster_sklearn, method="spectral"),
+    "hierarchical": functools.partial(_cluster_sklearn, method="hierarchical"),
+    "agglomerative": functools.partial(_cluster_sklearn, method="agglomerative"),
+}
+
+
+def _cluster_method(method):
+    """Name of the clustering method corresponding to an alias (defaults to spectral clustering).
+    """
+    return _cluster_aliases.get(method.lower(), "spectral")
+
+
 def _cluster_getclusters(data, clustering):
     """Get average representatives of clusters
     """
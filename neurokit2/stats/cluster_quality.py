@@ -215,7 +215,8 @@ def _cluster_quality_gap(data, clusters, clustering, info, n_random=10):
         # Cluster random
         _, random_clusters, info = info["clustering_function"](random_data)
         random_activation = random_clusters.dot(random_data.T)
-        random_clustering = np.argmax(np.abs(random_activation), axis=0)
+        np.square(random_activation, out=random_activation)  # In-place, same argmax as abs()
+        random_clustering = np.argmax(random_activation, axis=0)
         dispersion_random[i] = _cluster_quality_sumsquares(random_data, random_clusters,
                                                            random_clustering)
 
@@ -242,7 +243,7 @@ def _cluster_quality_crossvalidation(data, clusters, clustering):
     leads to an error when the denominator is 0.
     """
     n_rows, n_cols = data.shape  # n_sample, n_channel
-    var = np.sum(data**2) - np.sum(np.sum(clusters[clustering, :] * data, axis=1)**2)
+    var = np.einsum("ij,ij->", data, data) - np.sum(np.sum(clusters[clustering, :] * data, axis=1)**2)
     var /= (n_rows * (n_cols - 1))
     try:
         cv = var * (n_cols - 1)**2 / (n_cols - len(clusters) - 1)**2
@@ -277,45 +278,14 @@ def _cluster_quality_gev(data, clusters, clustering, sd=None, n_clusters=4):
     """
     if sd is None:
         sd = np.std(data, axis=1)
-    map_corr = _correlate_vectors(data.T, clusters[clustering].T)
 
-    gev_all = np.zeros(n_clusters)
-    for state in range(n_clusters):
-        idx = (clustering == state)
-        gev_all[state] = np.sum((sd[idx] * map_corr[idx])**2) / np.sum(sd**2)
+    maps = clusters - np.mean(clusters, axis=1, keepdims=True)
+    maps /= np.linalg.norm(maps, axis=1, keepdims=True)
+    data = data - np.mean(data, axis=1, keepdims=True, dtype=np.float64)  # Precise on offset data
+    map_corr = np.einsum("tc,tc->t", data, maps[clustering]) / np.linalg.norm(data, axis=1)
+
+    gev_all = np.bincount(clustering, weights=(sd * map_corr) ** 2, minlength=n_clusters)
+    gev_all = gev_all[:n_clusters] / np.dot(sd, sd)
 
     gev = np.sum(gev_all)
-#    gev = np.sum((sd * map_corr) ** 2) / np.sum(sd**2)
     return gev, gev_all
-
-def _correlate_vectors(A, B, axis=0):
-    """Compute pairwise correlation of multiple pairs of vectors.
-    Fast way to compute correlation of multiple pairs of vectors without
-    computing all pairs as would with corr(A,B). Borrowed from Oli at Stack
-    overflow.
-
-    Note the resulting coefficients vary slightly from the ones
-    obtained from corr due differences in the order of the calculations.
-    (Differences are of a magnitude of 1e-9 to 1e-17 depending of the tested
-    data).
-
-    Parameters
-    ----------
-    A : array
-        The first collection of vectors of shape (n, m)
-    B : array
-        The second collection of vectors of shape (n, m)
-    axis : int
-        The axis that contains the elements of each vector. Defaults to 0.
-
-    Returns
-    -------
-    corr : array
-        For each pair of vectors, the correlation between them with shape (m, )
-
-    """
-    An = A - np.mean(A, axis=axis)
-    Bn = B - np.mean(B, axis=axis)
-    An /= np.linalg.norm(An, axis=axis)
-    Bn /= np.linalg.norm(Bn, axis=axis)
-    return np.sum(An * Bn, axis=axis)
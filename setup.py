@@ -22,7 +22,7 @@ def find_version():
 
 
 # Dependencies
-requirements = ["numpy", "pandas", "scipy", "sklearn", "matplotlib"]
+requirements = ["numpy", "pandas", "scipy", "sklearn", "matplotlib", "joblib"]
 
 # Optional Dependencies (only needed / downloaded for testing purposes, for instance to test against some other packages)
 setup_requirements = ["pytest-runner", "numpy"]
@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
+import importlib
+
 import mne
 import numpy as np
+import pytest
 
 import neurokit2 as nk
+from neurokit2.microstates.microstates_segment import (
+    _microstates_segment_gev,
+    _microstates_segment_predict,
+)
+from neurokit2.stats.cluster_quality import _cluster_quality_gev
 
 # =============================================================================
 # Peaks
@@ -29,3 +37,56 @@ def test_microstates_peaks():
     peaks_frederic = locmax(gfp)
 
     assert all(elem in peaks_frederic for elem in peaks_nk)  # only works when distance_between = 0.01
+
+
+# =============================================================================
+# Segment
+# =============================================================================
+
+
+def test_microstates_segment_backend():
+
+    eeg = np.random.RandomState(0).randn(8, 2000)
+    with pytest.raises(ValueError):
+        nk.microstates_segment(eeg, sampling_rate=100, backend="gpu")
+
+
+def test_microstates_segment_arguments():
+
+    eeg = np.random.RandomState(0).randn(8, 2000)
+    with pytest.raises(ValueError):
+        nk.microstates_segment(eeg, sampling_rate=100, criterion="GEV")
+    with pytest.raises(ValueError):
+        nk.microstates_segment(eeg, sampling_rate=100, init="k-means++")
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+@pytest.mark.parametrize("n_states", [3, 4, 5])
+def test_microstates_segment_predict(monkeypatch, n_states, use_numba):
+
+    if not use_numba:
+        module = importlib.import_module("neurokit2.microstates.microstates_segment")
+        monkeypatch.setattr(module, "numba", None)
+
+    rng = np.random.RandomState(n_states)
+    data = rng.randn(16, 10000)
+    microstates = rng.randn(n_states, 16)
+    segmentation, polarity = _microstates_segment_predict(data, microstates)
+
+    activation = microstates.dot(data)
+    assert np.array_equal(segmentation, np.argmax(np.abs(activation), axis=0))
+    assert np.array_equal(polarity, np.sign(activation[segmentation, np.arange(data.shape[1])]))
+
+
+def test_microstates_segment_gev():
+
+    rng = np.random.RandomState(0)
+    data = rng.randn(16, 10000) + 10  # Offset to check the precision of the correlation
+    gfp = np.std(data, axis=0)
+    microstates = rng.randn(3, 4, 16)
+    gev = _microstates_segment_gev(data, microstates, gfp)
+
+    for run, maps in enumerate(microstates):
+        segmentation, _ = _microstates_segment_predict(data, maps)
+        gev_run, _ = _cluster_quality_gev(data.T, maps, segmentation, sd=gfp, n_clusters=4)
+        assert np.isclose(gev[run], gev_run)
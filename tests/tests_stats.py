@@ -1,7 +1,12 @@
+import importlib
+
 import numpy as np
 import pandas as pd
+import pytest
+import sklearn.decomposition
 
 import neurokit2 as nk
+from neurokit2.stats.cluster import _cluster_kmod_assign, _cluster_kmod_init, _cluster_method
 
 # =============================================================================
 # Stats
@@ -28,3 +33,73 @@ def test_fit_loess():
     signal = np.cos(np.linspace(start=0, stop=10, num=1000))
     fit = nk.fit_loess(signal, alpha=0.75)
     assert np.allclose(np.mean(signal - fit), -0.0201905899, atol=0.0001)
+
+
+# =============================================================================
+# Cluster
+# =============================================================================
+
+
+def test_cluster_kmod_init():
+
+    rng = np.random.RandomState(0)
+
+    # Samples with a null topography
+    data = rng.randn(100, 8)
+    data[:20] = 0
+    init_times = _cluster_kmod_init(data, n_clusters=4, random_state=0)
+    assert len(np.unique(init_times)) == 4
+    assert np.all(init_times >= 20)
+    _, _, info = nk.cluster(data, method="kmod", n_clusters=4, random_state=0)
+    assert not np.any(np.isnan(info["clusters_normalized"]))
+
+    # Fewer distinct topographies than clusters
+    data = np.tile(rng.randn(2, 8), (20, 1))
+    init_times = _cluster_kmod_init(data, n_clusters=4, random_state=0)
+    assert len(np.unique(init_times)) == 4
+    _, _, info = nk.cluster(data, method="kmod", n_clusters=4, random_state=0)
+    assert info["clusters_normalized"].shape == (4, 8)
+
+    with pytest.raises(ValueError):
+        nk.cluster(data, method="kmod", n_clusters=4, init="k-means++")
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+@pytest.mark.parametrize("n_clusters", [3, 4, 5])
+def test_cluster_kmod_assign(monkeypatch, n_clusters, use_numba):
+
+    if not use_numba:
+        monkeypatch.setattr(importlib.import_module("neurokit2.stats.cluster"), "numba", None)
+
+    rng = np.random.RandomState(n_clusters)
+    data = rng.randn(1000, 16)
+    clusters = rng.randn(n_clusters, 16)
+    segmentation, activation = _cluster_kmod_assign(data, clusters)
+
+    activation_all = clusters.dot(data.T)
+    assert np.array_equal(segmentation, np.argmax(np.abs(activation_all), axis=0))
+    assert np.allclose(activation, activation_all[segmentation, np.arange(len(data))])
+
+
+def test_cluster_pca():
+
+    # Wide data (randomized SVD) with a slowly decaying spectrum
+    rng = np.random.RandomState(0)
+    data = rng.randn(300, 600) * 0.98 ** np.arange(600)
+    loadings, _, _ = nk.cluster(data, method="pca", n_clusters=5, random_state=0)
+
+    pca = sklearn.decomposition.PCA(n_components=5, svd_solver="full").fit_transform(data)
+    for i in range(5):
+        assert np.abs(np.corrcoef(loadings["Loading_" + str(i)], pca[:, i])[0, 1]) > 0.999
+
+    with pytest.raises(TypeError):
+        nk.cluster(data, method="pca", n_clusters=5, svd_solver="full")
+
+
+def test_cluster_method():
+
+    assert _cluster_method("aahc") == "aahc"
+    assert _cluster_method("AAHC_frederic") == "aahc"
+    assert _cluster_method("ica") == "ica"
+    assert _cluster_method("ward") == "hierarchical"
+    assert _cluster_method("kmod") == "kmod"